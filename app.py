@@ -2,8 +2,10 @@ import streamlit as st
 import utils
 import json
 import pandas as pd
+from collections import deque
 from datetime import datetime
 import time
+import traceback
 
 # Page configuration
 st.set_page_config(
@@ -791,15 +793,17 @@ class CustomJSONEncoder(json.JSONEncoder):
 if 'report_generated' not in st.session_state:
     st.session_state.report_generated = False
 
-# Initialize debug storage
+# Initialize debug storage (bounded - keeps only the most recent API calls)
 if 'debug_api_calls' not in st.session_state:
-    st.session_state.debug_api_calls = []
+    st.session_state.debug_api_calls = deque(maxlen=50)
 
 col1, col2, col3 = st.columns([1, 1, 4])
 with col1:
     generate_button = st.button("GENERATE", use_container_width=True)
+with col2:
+    refresh_button = st.button("REFRESH", use_container_width=True, help="Regenerate, ignoring cached data")
 
-if generate_button:
+if generate_button or refresh_button:
     if company_name:
         try:
             # Clean up ticker input - add $ to avoid word interpretation issues
@@ -808,7 +812,7 @@ if generate_button:
                 ticker = f"${ticker}"
             
             # Clear previous debug data
-            st.session_state.debug_api_calls = []
+            st.session_state.debug_api_calls.clear()
             
             # Create progress tracking
             if 'progress_steps' not in st.session_state:
@@ -830,6 +834,7 @@ if generate_button:
                 for i in range(len(st.session_state.progress_steps)):
                     if st.session_state.progress_steps[i]['step'] == step:
                         st.session_state.progress_steps[i]['status'] = 'running'
+                        st.session_state.progress_steps[i]['message'] = message  # e.g. streaming progress
                         current_exists = True
                         break
                 
@@ -852,7 +857,8 @@ if generate_button:
             # Use Pure Perplexity for search + report generation (with progress updates)
             result = utils.generate_financial_report_with_perplexity(
                 ticker,  # Use sanitized ticker with $
-                progress_callback=update_progress
+                progress_callback=update_progress,
+                force_refresh=refresh_button
             )
             gen_time = time.time() - start_time
             
@@ -889,7 +895,6 @@ if generate_button:
         except Exception as e:
             st.error(f"ERROR: {str(e)}")
             with st.expander("DEBUG"):
-                import traceback
                 st.code(traceback.format_exc())
     else:
         st.warning("ENTER TICKER SYMBOL")
@@ -955,8 +960,7 @@ if st.session_state.report_generated:
     
     # Report display - render HTML with styling
     # Apply sanitizer as final guard to ensure clean HTML
-    from utils import sanitize_and_validate_html
-    sanitized_html = sanitize_and_validate_html(st.session_state.report_content)
+    sanitized_html = utils.sanitize_and_validate_html(st.session_state.report_content)
     
     st.markdown(
         f'<div class="report-container">{sanitized_html}</div>',
@@ -6,18 +6,30 @@ Uses OpenAI Responses API with web_search tool per latest OpenAI documentation.
 """
 
 import os
+import re
 import sys
-from typing import Any, Dict, Optional, List
-from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional, List
+from datetime import datetime
+from pathlib import Path
 import time
 import json
+import traceback
 import asyncio
 import random
+import threading
+import functools
+import hashlib
+import itertools
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import httpx
+import jinja2
 
-import pandas as pd
-import numpy as np
 from dotenv import load_dotenv
+import streamlit as st
 import streamlit.components.v1 as components
 
 # Fix Windows console encoding issues with emoji/unicode
@@ -28,35 +40,89 @@ if sys.platform == 'win32':
     except:
         pass  # If reconfigure not available, continue anyway
 
+# orjson is a much faster JSON codec; fall back to the stdlib if it isn't installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 load_dotenv(override=False)
 
 
-def get_random_api_key():
-    """Randomly select an API key from available keys"""
-    keys = []
+@functools.lru_cache(maxsize=None)
+def _env_bool(name: str, default: bool = False) -> bool:
+    """Boolean env flag, read once per process (restart to pick up changes)"""
+    v = os.getenv(name)
+    if v is None:
+        return default
+    return v.strip().lower() in ("1", "true", "yes", "y", "on")
+
+
+# All debug switches go through _env_bool: 1/true/yes/on enable them
+# Verbose diagnostics (timings, sanitizer traces) - same switch as DEBUG_HTML
+_DEBUG = _env_bool('DEBUG_HTML')
+
+# Record each Perplexity call in st.session_state.debug_api_calls (off in production)
+_DEBUG_API_CALLS = _env_bool('PPLX_DEBUG')
+
+
+def _json_dumps(obj: Any) -> bytes:
+    """Serialize to UTF-8 JSON bytes with sorted keys (stable request/cache keys)"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS)
+    return json.dumps(obj, sort_keys=True).encode("utf-8")
+
+
+def _json_loads(data: bytes) -> Any:
+    """Parse JSON bytes with orjson when available"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+@functools.lru_cache(maxsize=1)
+def _perplexity_keys() -> tuple:
+    """
+    API keys from the environment, read once per process.
     
+    PERPLEXITY_API_KEY_1..10 when any are set, else PERPLEXITY_API_KEY.
+    Restart the app to pick up changed keys.
+    """
     # Collect all PERPLEXITY_API_KEY_* variables
-    for i in range(1, 11):  # Check up to 10 keys
-        key = os.getenv(f"PERPLEXITY_API_KEY_{i}")
-        if key:
-            keys.append(key)
+    keys = tuple(key for key in (os.getenv(f"PERPLEXITY_API_KEY_{i}") for i in range(1, 11)) if key)  # Check up to 10 keys
     
     # Fallback to single key if no numbered keys found
     if not keys:
         fallback = os.getenv("PERPLEXITY_API_KEY")
-        if fallback:
-            return fallback
+        return (fallback,) if fallback else ()
+    return keys
+
+
+def get_random_api_key():
+    """Randomly select an API key from available keys"""
+    keys = _perplexity_keys()
+    if not keys:
         return ""
+    if len(keys) == 1:
+        return keys[0]
     
-    selected_key = random.choice(keys)
-    print(f"[INFO] Using API key #{keys.index(selected_key) + 1} of {len(keys)} available keys")
-    return selected_key
+    index = random.randrange(len(keys))
+    print(f"[INFO] Using API key #{index + 1} of {len(keys)} available keys")
+    return keys[index]
 
 
 # =====================================================================
 # PERPLEXITY HELPER - Circuit Breaker & Retry Logic
 # =====================================================================
 
+class CircuitOpenError(Exception):
+    """Raised when the circuit breaker is blocking Perplexity calls"""
+
+
+class PermanentAPIError(Exception):
+    """Raised for Perplexity responses that retrying cannot fix (bad request, auth, ...)"""
+
+
 class PerplexityCircuitBreaker:
     """Circuit breaker for Perplexity API calls to handle failures gracefully"""
     
@@ -64,37 +130,303 @@ class PerplexityCircuitBreaker:
         self.failure_threshold = failure_threshold
         self.timeout_duration = timeout_duration
         self.failure_count = 0
-        self.last_failure_time = None
+        self.last_failure_time: Optional[float] = None  # time.monotonic() of the last failure
         self.state = "CLOSED"  # CLOSED, OPEN, HALF_OPEN
+        self._lock = threading.Lock()  # Streamlit runs sessions on separate threads
     
     def is_open(self) -> bool:
         """Check if circuit breaker is open (blocking calls)"""
-        if self.state == "OPEN":
-            if self._should_attempt_reset():
-                self.state = "HALF_OPEN"
-                return False
-            return True
-        return False
+        with self._lock:
+            if self.state == "OPEN":
+                if self._should_attempt_reset():
+                    self.state = "HALF_OPEN"
+                    return False
+                return True
+            return False
     
     def _should_attempt_reset(self) -> bool:
-        """Check if enough time has passed to try again"""
-        if self.last_failure_time:
-            elapsed = datetime.now() - self.last_failure_time
-            return elapsed >= timedelta(seconds=self.timeout_duration)
+        """Check if enough time has passed to try again (caller holds the lock)"""
+        if self.last_failure_time is not None:
+            return time.monotonic() - self.last_failure_time >= self.timeout_duration
         return False
     
     def record_success(self):
         """Record successful API call"""
-        self.failure_count = 0
-        self.state = "CLOSED"
+        with self._lock:
+            self.failure_count = 0
+            self.state = "CLOSED"
     
     def record_failure(self):
         """Record failed API call"""
-        self.failure_count += 1
-        self.last_failure_time = datetime.now()
-        if self.failure_count >= self.failure_threshold:
-            self.state = "OPEN"
-            print(f"[WARNING] Circuit breaker OPEN after {self.failure_count} failures")
+        with self._lock:
+            self.failure_count += 1
+            self.last_failure_time = time.monotonic()
+            if self.failure_count >= self.failure_threshold:
+                self.state = "OPEN"
+                print(f"[WARNING] Circuit breaker OPEN after {self.failure_count} failures")
+    
+    @contextmanager
+    def guard(self):
+        """Block the wrapped call while OPEN, then record its outcome"""
+        if self.is_open():
+            raise CircuitOpenError("Perplexity service temporarily unavailable (circuit breaker open)")
+        try:
+            yield
+        except Exception:
+            self.record_failure()
+            raise
+        self.record_success()
+
+
+PERPLEXITY_API_URL = "https://api.perplexity.ai/chat/completions"
+
+# Ask for brotli-compressed responses when a decoder is installed (urllib3 and
+# httpx both pick it up automatically); otherwise stick to gzip
+try:
+    import brotli  # noqa: F401
+    _ACCEPT_ENCODING = "br, gzip"
+except ImportError:
+    _ACCEPT_ENCODING = "gzip"
+
+
+def _pplx_headers(api_key: str) -> Dict[str, str]:
+    return {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json",
+        "Accept-Encoding": _ACCEPT_ENCODING
+    }
+
+
+# Statuses worth retrying; anything else non-200 fails fast
+_TRANSIENT_STATUS = frozenset({408, 429, 500, 502, 503, 504})
+
+# Retry schedule shared by the sync session (urllib3) and the async batch path
+_BACKOFF_BASE = 1.0    # seconds before the first retry
+_BACKOFF_MAX = 30.0
+_BACKOFF_JITTER = 1.0
+
+
+def _backoff_delay(attempt: int) -> float:
+    """
+    Seconds to wait before retry number `attempt` (1-based): 1s, 2s, 4s...
+    plus up to _BACKOFF_JITTER of random jitter so parallel callers don't
+    retry in lockstep, capped at _BACKOFF_MAX. A Retry-After header from the
+    server takes precedence, capped the same way (see _PplxRetry).
+    """
+    return min(_BACKOFF_BASE * 2 ** (attempt - 1) + random.uniform(0, _BACKOFF_JITTER), _BACKOFF_MAX)
+
+
+class _PplxRetry(Retry):
+    """
+    urllib3 Retry that sleeps on the shared _backoff_delay schedule and caps
+    Retry-After at _BACKOFF_MAX, so one "Retry-After: 3600" can't park a
+    Streamlit worker for an hour.
+    """
+    
+    def get_backoff_time(self) -> float:
+        return _backoff_delay(len(self.history))  # history holds the failed attempts so far
+    
+    def parse_retry_after(self, retry_after: str) -> float:
+        return min(super().parse_retry_after(retry_after), _BACKOFF_MAX)
+
+
+def _retry_after_seconds(header: Optional[str]) -> Optional[float]:
+    """Retry-After (seconds or HTTP date) parsed and capped like the session does; None if absent/invalid"""
+    if not header:
+        return None
+    try:
+        return _PplxRetry().parse_retry_after(header)
+    except Exception:
+        return None
+
+
+@functools.lru_cache(maxsize=None)
+def _pplx_session(max_retries: int) -> requests.Session:
+    """
+    Pooled session for Perplexity calls with retries handled by urllib3.
+    
+    Keep-alive connections are reused across calls. One session is kept per
+    retry budget (callers use 2, 3 or 5 attempts). Transient statuses and
+    connection/read errors are retried on the _backoff_delay schedule,
+    honoring Retry-After on 429/503.
+    """
+    retry = _PplxRetry(
+        total=max_retries - 1,  # max_retries counts attempts, Retry counts retries
+        status_forcelist=_TRANSIENT_STATUS,
+        allowed_methods=frozenset(["POST"]),
+        respect_retry_after_header=True,
+        raise_on_status=False  # hand back the last response so it can be classified
+    )
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(max_retries=retry, pool_connections=10, pool_maxsize=20))
+    return session
+
+
+def _raise_for_pplx_status(response, max_retries: int):
+    """Raise for a non-200 response (requests or httpx) that has already been retried"""
+    if response.status_code in _TRANSIENT_STATUS:  # Rate limited / server hiccup
+        raise Exception(f"HTTP {response.status_code} persisted after {max_retries} attempts")
+    # Bad request, auth, not found... retrying won't help
+    raise PermanentAPIError(f"Perplexity API error {response.status_code}: {response.text[:200]}")
+
+
+def _perplexity_post(api_key: str, payload_json: bytes, max_retries: int, timeout: int) -> Dict[str, Any]:
+    """
+    POST a serialized payload to Perplexity; transient failures are retried by
+    the session. The circuit breaker wraps only this real network call, so
+    result-cache hits never count as successes.
+    """
+    with _perplexity_circuit_breaker.guard():
+        try:
+            response = _pplx_session(max_retries).post(
+                PERPLEXITY_API_URL,
+                headers=_pplx_headers(api_key),
+                data=payload_json,
+                timeout=timeout
+            )
+        except requests.exceptions.RequestException as e:
+            raise Exception(f"Request failed after {max_retries} attempts: {e}")
+        
+        if response.status_code == 200:
+            return _json_loads(response.content)
+        _raise_for_pplx_status(response, max_retries)
+
+
+class _UncachedResponse(Exception):
+    """Carries a response out of _pplx_call_cached without it being cached"""
+    
+    def __init__(self, response_json: Dict[str, Any]):
+        super().__init__("response rejected by cache_if")
+        self.response_json = response_json
+
+
+@st.cache_data(ttl=3600, show_spinner=False, max_entries=256)
+def _pplx_call_cached(
+    payload_json: bytes,
+    _api_key: str,
+    _max_retries: int,
+    _timeout: int,
+    _cache_if: Optional[Callable[[Dict[str, Any]], bool]] = None
+) -> Dict[str, Any]:
+    """
+    Cached Perplexity call keyed on the serialized payload only.
+    
+    Underscore-prefixed args are excluded from Streamlit's cache key, so the
+    API key never becomes part of it. Failed calls raise and are not cached,
+    and neither are responses _cache_if rejects - they are handed back via
+    _UncachedResponse, so a bad answer isn't replayed for an hour.
+    """
+    response_json = _perplexity_post(_api_key, payload_json, _max_retries, _timeout)
+    if _cache_if is not None and not _cache_if(response_json):
+        raise _UncachedResponse(response_json)
+    return response_json
+
+
+# In-flight Perplexity calls keyed by payload digest (single-flight coalescing)
+_INFLIGHT: Dict[str, Future] = {}
+_INFLIGHT_LOCK = threading.Lock()
+
+
+def _payload_key(payload_json: bytes) -> str:
+    """Single-flight key for a serialized request payload"""
+    return hashlib.blake2b(payload_json, digest_size=16).hexdigest()
+
+
+def _single_flight(key: str, fn):
+    """
+    Run fn() once per key at a time; concurrent callers with the same key
+    wait for the first call and get its result (or its exception).
+    
+    The result cache only holds completed calls, this covers the ones still
+    in flight (e.g. the same prompt fired twice by overlapping reruns).
+    """
+    with _INFLIGHT_LOCK:
+        future = _INFLIGHT.get(key)
+        leader = future is None
+        if leader:
+            future = _INFLIGHT[key] = Future()
+    
+    if not leader:
+        return future.result()
+    
+    try:
+        result = fn()
+        future.set_result(result)
+        return result
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _INFLIGHT_LOCK:
+            _INFLIGHT.pop(key, None)
+
+
+def _normalize_citations(citations) -> List[Dict[str, Any]]:
+    """
+    Citations as {"url", "title", "is_sec"} dicts with stripped URLs; empty
+    ones dropped. is_sec is worked out here once so counting is a flag read.
+    """
+    out = []
+    for c in citations or ():
+        if isinstance(c, dict):
+            url = (c.get("url") or "").strip()
+            if url:
+                out.append({**c, "url": url, "is_sec": 'sec.gov' in url})
+        elif isinstance(c, str):
+            url = c.strip()
+            if url:
+                out.append({"url": url, "title": "Source", "is_sec": 'sec.gov' in url})
+    return out
+
+
+def _extract_content_and_citations(response_json: Dict[str, Any]):
+    """Pull (message content, normalized citations) out of a chat/completions response"""
+    choices = response_json.get("choices")
+    if not choices:
+        # A 200 without choices won't improve on retry - fail with a clear message
+        raise PermanentAPIError(f"Perplexity response has no choices: {str(response_json)[:200]}")
+    return choices[0]["message"]["content"], _normalize_citations(response_json.get("citations"))
+
+
+def _get_debug_sink():
+    """
+    The current session's debug_api_calls container, or None outside an app session.
+    
+    Resolved per call on purpose: session_state is per browser session, so a
+    cached reference would leak entries between users.
+    """
+    try:
+        return st.session_state.debug_api_calls
+    except (AttributeError, KeyError):
+        return None
+
+
+def _record_debug_call(payload: Dict[str, Any], response_json: Dict[str, Any]):
+    """Append a call summary to the session's debug log, if the app set one up"""
+    try:
+        sink = _get_debug_sink()
+        if sink is None:
+            return  # Nothing to record into - skip building the entry (and its timestamp)
+        prompt = payload['messages'][0]['content']
+        content, citations = _extract_content_and_citations(response_json)
+        sink.append({
+            'timestamp': datetime.utcnow().isoformat(),
+            'request': {
+                'model': payload['model'],
+                'search_mode': payload.get('search_mode'),
+                'search_after_date_filter': payload.get('search_after_date_filter'),
+                # Digest + preview instead of the full multi-KB prompt
+                'prompt_digest': hashlib.blake2b(prompt.encode('utf-8'), digest_size=8).hexdigest(),
+                'prompt_preview': prompt[:200]
+            },
+            'response': {
+                'content': content,
+                'citations': citations
+            }
+        })
+    except Exception:
+        # Silently ignore if streamlit session_state is not available
+        pass
 
 
 def perplexity_request_with_retry(
@@ -107,111 +439,226 @@ def perplexity_request_with_retry(
     return_related_questions: bool = False,
     web_search_options: Optional[Dict[str, str]] = None,
     max_retries: int = 5,
-    timeout: int = 120
+    timeout: int = 120,
+    cache_if: Optional[Callable[[Dict[str, Any]], bool]] = None
 ) -> Dict[str, Any]:
     """
     Make Perplexity API request using requests library (per official documentation).
     
     Implements best practices from Perplexity documentation:
-    - Uses requests.post() directly for Perplexity-specific parameters
-    - Exponential backoff with jitter
+    - Uses a pooled requests.Session for Perplexity-specific parameters
+    - urllib3 retries with jittered, capped backoff, honoring Retry-After
     - Handles rate limits gracefully
     - Circuit breaker pattern for reliability
+    - Caches identical requests for an hour across Streamlit reruns (only
+      responses cache_if accepts, when given)
     - Supports search_mode parameter for specialized searches (e.g., "sec" for SEC filings)
     - Supports web_search_options for search_context_size (low/medium/high)
     """
     
-    url = "https://api.perplexity.ai/chat/completions"
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
+    # Build request payload per Perplexity documentation; optional
+    # Perplexity-specific parameters are only sent when set
+    optional_params = (
+        ("search_mode", search_mode),
+        ("search_after_date_filter", search_after_date_filter),
+        ("return_images", return_images),
+        ("return_related_questions", return_related_questions),
+        ("web_search_options", web_search_options)
+    )
+    payload = {
+        "model": model,
+        "messages": messages,
+        **{key: value for key, value in optional_params if value}
     }
     
-    for attempt in range(max_retries):
+    # Serialized once: used as both the request body and the cache key
+    payload_json = _json_dumps(payload)
+    
+    def fetch() -> Dict[str, Any]:
+        # Image responses aren't cached; while the breaker isn't CLOSED, go
+        # straight to the (guarded) network call so OPEN fails fast and the
+        # half-open probe really hits the API
+        if return_images or _perplexity_circuit_breaker.state != "CLOSED":
+            return _perplexity_post(api_key, payload_json, max_retries, timeout)
         try:
-            # Build request payload per Perplexity documentation
-            payload = {
-                "model": model,
-                "messages": messages
-            }
-            
-            # Add optional Perplexity-specific parameters
-            if search_mode:
-                payload["search_mode"] = search_mode
-            if search_after_date_filter:
-                payload["search_after_date_filter"] = search_after_date_filter
-            if return_images:
-                payload["return_images"] = return_images
-            if return_related_questions:
-                payload["return_related_questions"] = return_related_questions
-            if web_search_options:
-                payload["web_search_options"] = web_search_options
-            
-            # Make API call using requests
-            response = requests.post(
-                url,
-                headers=headers,
-                json=payload,
-                timeout=timeout
-            )
-            
-            # Check for success
-            if response.status_code == 200:
-                response_json = response.json()
-                
-                # Store debug info in session if available
+            return _pplx_call_cached(payload_json, api_key, max_retries, timeout, cache_if)
+        except _UncachedResponse as e:
+            return e.response_json
+    
+    # Identical payloads already on the wire share that call's result
+    response_json = _single_flight(_payload_key(payload_json), fetch)
+    
+    if _DEBUG_API_CALLS:
+        _record_debug_call(payload, response_json)
+    
+    return response_json
+
+
+def perplexity_request_streaming(
+    api_key: str,
+    model: str,
+    messages: List[Dict],
+    web_search_options: Optional[Dict[str, str]] = None,
+    max_retries: int = 5,
+    timeout: int = 120,
+    on_progress: Optional[Callable[[int], None]] = None,
+    progress_every: int = 40
+) -> Dict[str, Any]:
+    """
+    Like perplexity_request_with_retry, but streams the completion (stream=True).
+    
+    on_progress(chars_received) is called every progress_every data events so
+    the UI can show a long reasoning call making headway. Returns a response
+    shaped like the non-streaming one (choices[0].message.content plus citations).
+    
+    Connection setup and transient statuses are retried by the session; a stream
+    that breaks mid-way is not restarted. Concurrent identical requests (streamed
+    or not) are coalesced under the same single-flight key as
+    perplexity_request_with_retry - callers that join an in-flight call get its
+    result without progress updates. Streamed calls bypass the result cache
+    (_pplx_call_cached), since each run has to report its own progress.
+    """
+    request = {"model": model, "messages": messages}
+    if web_search_options:
+        request["web_search_options"] = web_search_options
+    payload = {**request, "stream": True}
+    
+    def fetch() -> Dict[str, Any]:
+        parts = []
+        received = 0
+        events = 0
+        citations = []
+        
+        with _perplexity_circuit_breaker.guard():
+            try:
+                response = _pplx_session(max_retries).post(
+                    PERPLEXITY_API_URL,
+                    headers=_pplx_headers(api_key),
+                    data=_json_dumps(payload),
+                    timeout=timeout,
+                    stream=True
+                )
+                with response:
+                    if response.status_code != 200:
+                        _raise_for_pplx_status(response, max_retries)
+                    
+                    # Server-sent events: "data: {chunk json}" lines, ending with "data: [DONE]"
+                    for line in response.iter_lines():
+                        if not line.startswith(b"data:"):
+                            continue
+                        data = line[5:].strip()
+                        if data == b"[DONE]":
+                            break
+                        chunk = _json_loads(data)
+                        events += 1
+                        if chunk.get("choices"):
+                            delta = chunk["choices"][0].get("delta", {}).get("content")
+                            if delta:
+                                parts.append(delta)
+                                received += len(delta)
+                        citations = chunk.get("citations") or citations
+                        if on_progress and events % progress_every == 0:
+                            on_progress(received)
+            except requests.exceptions.RequestException as e:
+                raise Exception(f"Streaming request failed: {e}")
+        
+        return {
+            "choices": [{"message": {"role": "assistant", "content": "".join(parts)}}],
+            "citations": citations
+        }
+    
+    # Keyed on the non-streaming payload so it matches perplexity_request_with_retry
+    response_json = _single_flight(_payload_key(_json_dumps(request)), fetch)
+    
+    if _DEBUG_API_CALLS:
+        _record_debug_call(payload, response_json)
+    
+    return response_json
+
+
+async def _pplx_post_async(
+    client: httpx.AsyncClient,
+    payload: Dict[str, Any],
+    sem: asyncio.Semaphore,
+    max_retries: int
+) -> Dict[str, Any]:
+    """
+    POST one payload through the shared async client, bounded by the semaphore.
+    
+    Mirrors the sync path: the call runs under the circuit breaker, transient
+    statuses and transport errors are retried on the same _backoff_delay
+    schedule (Retry-After first, parsed like the session does), and final
+    failures are classified by _raise_for_pplx_status. httpx has no urllib3
+    Retry hook, hence the explicit loop.
+    """
+    payload_json = _json_dumps(payload)
+    async with sem:
+        with _perplexity_circuit_breaker.guard():
+            for attempt in range(1, max_retries + 1):
                 try:
-                    import streamlit as st
-                    if hasattr(st, 'session_state') and 'debug_api_calls' in st.session_state:
-                        st.session_state.debug_api_calls.append({
-                            'timestamp': datetime.utcnow().isoformat(),
-                            'request': {
-                                'model': model,
-                                'search_mode': search_mode,
-                                'search_after_date_filter': search_after_date_filter,
-                                'prompt': messages[0]['content']  # Show full prompt, no truncation
-                            },
-                            'response': {
-                                'content': response_json['choices'][0]['message']['content'],
-                                'citations': response_json.get('citations', [])
-                            }
-                        })
-                except Exception:
-                    # Silently ignore if streamlit session_state is not available
-                    pass
-                
-                return response_json
-            elif response.status_code == 429:  # Rate limited
-                if attempt < max_retries - 1:
-                    delay = (2 ** attempt) + random.uniform(0, 1)
-                    print(f"[WARNING] Rate limited (429). Retrying in {delay:.2f} seconds (attempt {attempt + 1}/{max_retries})...")
-                    time.sleep(delay)
+                    response = await client.post(PERPLEXITY_API_URL, content=payload_json)
+                except httpx.TransportError as e:
+                    if attempt == max_retries:
+                        raise Exception(f"Request failed after {max_retries} attempts: {e}")
+                    await asyncio.sleep(_backoff_delay(attempt))
                     continue
-                else:
-                    raise Exception(f"Rate limit exceeded after {max_retries} retries")
-            else:
-                response.raise_for_status()
-            
-        except requests.exceptions.Timeout:
-            if attempt < max_retries - 1:
-                delay = (2 ** attempt) + random.uniform(0, 1)
-                print(f"[WARNING] Request timeout. Retrying in {delay:.2f} seconds (attempt {attempt + 1}/{max_retries})...")
-                time.sleep(delay)
-                continue
-            else:
-                raise Exception(f"Request timeout after {max_retries} retries")
                 
-        except requests.exceptions.RequestException as e:
-            error_str = str(e).lower()
-            if ("rate" in error_str or "429" in error_str) and attempt < max_retries - 1:
-                delay = (2 ** attempt) + random.uniform(0, 1)
-                print(f"[WARNING] Rate limited. Retrying in {delay:.2f} seconds (attempt {attempt + 1}/{max_retries})...")
-                time.sleep(delay)
-                continue
-            else:
-                raise e
+                if response.status_code == 200:
+                    return _json_loads(response.content)
+                if response.status_code not in _TRANSIENT_STATUS or attempt == max_retries:
+                    _raise_for_pplx_status(response, max_retries)
+                await asyncio.sleep(_retry_after_seconds(response.headers.get("Retry-After")) or _backoff_delay(attempt))
+
+
+def _run_sync(coro):
+    """
+    asyncio.run(coro), also when called from a thread that already runs an
+    event loop (where asyncio.run raises) - the coroutine then gets its own
+    loop in a worker thread.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coro).result()
+
+
+async def perplexity_request_batch_async(
+    api_key: str,
+    payloads: List[Dict[str, Any]],
+    max_concurrency: int = 10,
+    timeout: int = 120,
+    max_retries: int = 3
+) -> List[Dict[str, Any]]:
+    """
+    Fire several Perplexity requests concurrently.
     
-    raise Exception(f"Max retries ({max_retries}) exceeded for Perplexity API call")
+    Each payload is a full chat/completions body (model, messages, options).
+    One HTTP/2 AsyncClient is shared by the whole batch so requests multiplex
+    over a single TLS connection. Results are returned in payload order.
+    Batched calls use the circuit breaker and retry policy but not the
+    result cache (_pplx_call_cached), which is sync-only.
+    """
+    sem = asyncio.Semaphore(max_concurrency)
+    async with httpx.AsyncClient(
+        http2=True,
+        headers=_pplx_headers(api_key),
+        timeout=timeout,
+        limits=httpx.Limits(max_keepalive_connections=20)
+    ) as client:
+        return await asyncio.gather(*(_pplx_post_async(client, payload, sem, max_retries) for payload in payloads))
+
+
+def perplexity_request_batch(
+    api_key: str,
+    payloads: List[Dict[str, Any]],
+    max_concurrency: int = 10,
+    timeout: int = 120,
+    max_retries: int = 3
+) -> List[Dict[str, Any]]:
+    """Synchronous wrapper around perplexity_request_batch_async (safe inside a running event loop)"""
+    return _run_sync(perplexity_request_batch_async(api_key, payloads, max_concurrency, timeout, max_retries))
 
 
 # Initialize circuit breaker
@@ -222,46 +669,206 @@ _perplexity_circuit_breaker = PerplexityCircuitBreaker()
 # HELPER FUNCTIONS
 # =====================================================================
 
+_PROMPTS_DIR = Path(__file__).parent / "prompts"
+
+
+@functools.cache
+def _load_prompt(name: str) -> str:
+    """Read a prompt template from prompts/ on first use and keep it for the process"""
+    return (_PROMPTS_DIR / name).read_text(encoding="utf-8")
+
+
+# Call 2 returns JSON; the report markup comes from this template, compiled once
+_TEMPLATE_ENV = jinja2.Environment(
+    loader=jinja2.FileSystemLoader(Path(__file__).parent / "templates"),
+    autoescape=True,
+    trim_blocks=True,
+    lstrip_blocks=True
+)
+_HEALTH_REPORT_TEMPLATE = _TEMPLATE_ENV.get_template("health_report.html")
+
+_POINT_ICONS = {"positive": "✓", "negative": "✗", "warning": "⚠"}
+_SCORE_RE = re.compile(r'-?\d+')
+
+
+def _score_indicator(score: int) -> str:
+    if score >= 80:
+        return "🟢"
+    if score >= 60:
+        return "🟡"
+    if score >= 40:
+        return "🟠"
+    return "🔴"
+
+
+def _parse_score(value: Any) -> int:
+    """Score as an int in 0-100; tolerates strings like "~62" or "62/100" """
+    if isinstance(value, (int, float)):
+        score = int(value)
+    else:
+        match = _SCORE_RE.search(str(value))
+        if not match:
+            raise ValueError(f"no score in {value!r}")
+        score = int(match.group())
+    return min(max(score, 0), 100)
+
+
+def _parse_health_report(text: str) -> Optional[Dict[str, Any]]:
+    """
+    Template fields from Call 2's JSON answer, or None when the answer isn't
+    a usable JSON object.
+    """
+    start, end = text.find('{'), text.rfind('}')
+    if start == -1 or end < start:
+        return None
+    try:
+        data = _json_loads(text[start:end + 1])
+        score = _parse_score(data["score"])
+        points = [
+            {
+                "type": point["type"] if point.get("type") in _POINT_ICONS else "warning",
+                "icon": _POINT_ICONS.get(point.get("type"), "⚠"),
+                "text": str(point["text"]).strip()
+            }
+            for point in data["points"]
+        ]
+        if not points:
+            raise ValueError("no points")
+    except (ValueError, TypeError, KeyError, AttributeError) as e:
+        print(f"[WARNING] Call 2 JSON not usable: {e}")
+        return None
+    
+    return {
+        "score": score,
+        "score_calculation": str(data.get("score_calculation") or ""),
+        "points": points
+    }
+
+
+def _render_health_report(company_name: str, text: str) -> Optional[str]:
+    """
+    Render Call 2's JSON answer through the health report template.
+    
+    Returns None when the answer isn't a usable JSON object; the caller then
+    reports an error (broken JSON) or sanitizes it (any other text).
+    """
+    report = _parse_health_report(text)
+    if report is None:
+        return None
+    return _HEALTH_REPORT_TEMPLATE.render(
+        company_name_upper=company_name.upper(),
+        indicator=_score_indicator(report["score"]),
+        **report
+    )
+
+
+# Patterns for cleaning raw Perplexity answers, compiled once at import
+_THINK_RE = re.compile(r'<think>.*?</think>', re.DOTALL)  # sonar-reasoning-pro reasoning
+_OPEN_FENCE_RE = re.compile(r'^```\w*\n')
+_CLOSE_FENCE_RE = re.compile(r'\n```$')
+_SEC_URL_RE = re.compile(r'https://www\.sec\.gov/[^\s\)\]]+')
+
+
+def _clean_report_text(text: str) -> str:
+    """Call 2 answer without <think> reasoning or a wrapping markdown code fence"""
+    text = _THINK_RE.sub('', text).strip()
+    if text.startswith('```'):
+        text = _OPEN_FENCE_RE.sub('', text)
+        text = _CLOSE_FENCE_RE.sub('', text).strip()
+    return text
+
+
+def _is_renderable_report(response_json: Dict[str, Any]) -> bool:
+    """cache_if for Call 2: only answers the health report template can render"""
+    try:
+        content, _ = _extract_content_and_citations(response_json)
+    except PermanentAPIError:
+        return False
+    return _parse_health_report(_clean_report_text(content)) is not None
+
+
+def _sec_data_is_thin(sec_data: str) -> bool:
+    """True when Call 1's answer looks too short or admits missing data"""
+    lowered = sec_data.lower()
+    return (
+        len(sec_data) < 500
+        or "cannot" in lowered
+        or "not available" in lowered
+        or "missing critical data" in lowered
+    )
+
+
+def _has_sec_data(response_json: Dict[str, Any]) -> bool:
+    """cache_if for Call 1: keep thin answers out of the cache so they get retried"""
+    try:
+        content, _ = _extract_content_and_citations(response_json)
+    except PermanentAPIError:
+        return False
+    return not _sec_data_is_thin(_THINK_RE.sub('', content).strip())
+
+# Patterns used by sanitize_and_validate_html, compiled once at import
+_CODE_FENCE_RE = re.compile(r'```(?:html)?\s*\n?(.*?)\n?```', re.DOTALL)
+_FENCE_MARKER_RE = re.compile(r'```(?:html)?\n?')
+_PRE_CODE_RE = re.compile(r'<pre><code>(.*?)</code></pre>', re.DOTALL)
+_PRE_RE = re.compile(r'<pre>(.*?)</pre>', re.DOTALL)
+_CODE_RE = re.compile(r'<code>(.*?)</code>', re.DOTALL)
+_LEADING_WS_RE = re.compile(r'^[ \t]+(?=<)', re.MULTILINE)
+_REPORT_CONTAINER_RE = re.compile(r'<div class="report-container">\s*(.*?)\s*</div>\s*$', re.DOTALL)
+_TRAILING_QUOTE_RE = re.compile(r'</div>"\s*$')
+
+
+def _needs_sanitize(html: str) -> bool:
+    """
+    False only for HTML every sanitizer step would leave unchanged: a bare,
+    flush-left, div-balanced health report with no fences or pre/code wrappers.
+    That is what the report template renders, and app.py re-checks it on
+    every rerun.
+    """
+    return not (
+        html.startswith('<div class="health-report">')
+        and html.endswith('</div>')
+        and '`' not in html
+        and '<pre' not in html
+        and '<code' not in html
+        and '\n ' not in html
+        and '\n\t' not in html
+        and 'report-container' not in html
+        and html.count('<div') == html.count('</div>')
+    )
+
+
 def sanitize_and_validate_html(html: str) -> str:
     """
     Sanitize and validate HTML to ensure it renders properly in Streamlit.
     Removes code fences, wrappers, indentation, and validates structure.
     """
-    import re
-    import os
-    
-    debug = os.getenv('DEBUG_HTML', 'false').lower() == 'true'
+    if not _needs_sanitize(html):
+        return html
     
     try:
         # 1. Remove code fences
-        code_fence_match = re.search(r'```(?:html)?\s*\n?(.*?)\n?```', html, re.DOTALL)
+        code_fence_match = _CODE_FENCE_RE.search(html)
         if code_fence_match:
-            if debug:
+            if _DEBUG:
                 print("[DEBUG] Extracting HTML from code fence")
             html = code_fence_match.group(1).strip()
         else:
-            html = re.sub(r'```html\n?', '', html)
-            html = re.sub(r'```\n?', '', html)
-            html = html.replace('```html', '').replace('```', '')
+            html = _FENCE_MARKER_RE.sub('', html)
         
         # 2. Strip <pre><code>, <pre>, <code> wrappers
-        html = re.sub(r'<pre><code>(.*?)</code></pre>', r'\1', html, flags=re.DOTALL)
-        html = re.sub(r'<pre>(.*?)</pre>', r'\1', html, flags=re.DOTALL)
-        html = re.sub(r'<code>(.*?)</code>', r'\1', html, flags=re.DOTALL)
+        html = _PRE_CODE_RE.sub(r'\1', html)
+        html = _PRE_RE.sub(r'\1', html)
+        html = _CODE_RE.sub(r'\1', html)
         
         # 3. CRITICAL: Dedent lines starting with whitespace before tags
         # This prevents Streamlit's Markdown renderer from treating indented HTML as code blocks
-        html = re.sub(r'^[ \t]+(?=<)', '', html, flags=re.MULTILINE)
+        html = _LEADING_WS_RE.sub('', html)
         
         # 4. Remove report-container wrapper if present (app.py adds it)
         if '<div class="report-container">' in html:
-            if debug:
+            if _DEBUG:
                 print("[DEBUG] Removing report-container wrapper")
-            container_match = re.search(
-                r'<div class="report-container">\s*(.*?)\s*</div>\s*$',
-                html,
-                re.DOTALL
-            )
+            container_match = _REPORT_CONTAINER_RE.search(html)
             if container_match:
                 html = container_match.group(1).strip()
             else:
@@ -269,14 +876,14 @@ def sanitize_and_validate_html(html: str) -> str:
                 html = html.replace('<div class="report-container">', '', 1)
         
         # 5. Normalize stray trailing quotes after closing tags
-        html = re.sub(r'</div>"\s*$', '</div>', html)
+        html = _TRAILING_QUOTE_RE.sub('</div>', html)
         
         # 6. Trim whitespace
         html = html.strip()
         
         # 7. Validate it starts with <div
         if not html.startswith('<div'):
-            if debug:
+            if _DEBUG:
                 print(f"[DEBUG] HTML doesn't start with <div, searching...")
             start_idx = html.find('<div')
             if start_idx > 0:
@@ -284,32 +891,44 @@ def sanitize_and_validate_html(html: str) -> str:
         
         # 8. Validate structure - should start with section div
         if not html.startswith('<div class="section">'):
-            if debug:
+            if _DEBUG:
                 preview = html[:min(100, len(html))].replace('\n', ' ')
                 print(f"[DEBUG] Warning: doesn't start with section div. First 100: {preview}")
         
         # 9. Balance div tags
-        open_divs = len(re.findall(r'<div\b', html))
-        close_divs = len(re.findall(r'</div>', html))
+        open_divs = html.count('<div')
+        close_divs = html.count('</div>')
         
         if open_divs > close_divs:
-            if debug:
+            if _DEBUG:
                 print(f"[DEBUG] Unclosed divs: {open_divs - close_divs}, appending closing tags")
             html += '</div>' * (open_divs - close_divs)
         elif close_divs > open_divs:
             # Too many closing tags - try to trim extras from end
-            if debug:
+            if _DEBUG:
                 print(f"[DEBUG] Extra closing divs: {close_divs - open_divs}")
-            # Remove excess </div> from end
+            # Remove excess </div> from end: walk back once, then rebuild in one join
+            cuts = []
+            end = len(html)
             for _ in range(close_divs - open_divs):
-                last_close = html.rfind('</div>')
-                if last_close > 0:
-                    html = html[:last_close] + html[last_close + 6:]
+                last_close = html.rfind('</div>', 0, end)
+                if last_close <= 0:
+                    break
+                cuts.append(last_close)
+                end = last_close
+            if cuts:
+                pieces = []
+                end = len(html)
+                for last_close in cuts:
+                    pieces.append(html[last_close + 6:end])
+                    end = last_close
+                pieces.append(html[:end])
+                html = ''.join(reversed(pieces))
         
         # 10. Final cleanup
         html = html.rstrip('`').strip()
         
-        if debug:
+        if _DEBUG:
             print(f"[DEBUG] Sanitized HTML: {len(html)} chars, {open_divs} divs")
             print(f"[DEBUG] First 120 chars: {html[:120].replace(chr(10), ' ')}")
         
@@ -332,255 +951,14 @@ def generate_report_with_perplexity(
     1. Receives SEC data from Call 1
     2. Searches for market data and earnings
     3. Analyzes everything holistically
-    4. Generates HTML report
+    4. Returns the report as JSON, rendered to HTML via templates/health_report.html
     """
-    import re
-    
     print("[Call 2/2] Gathering market data, analyzing, and generating report...")
     
-    comprehensive_prompt = f"""You are a financial analyst creating a CONCISE financial health score report.
-
-COMPANY: {company_name}
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-📊 SEC FILING DATA (ALREADY PROVIDED - DO NOT RE-SEARCH)
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-{sec_data}
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-🎯 YOUR TASK - FOLLOW THIS FORMAT EXACTLY
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-**STEP 1: Search for MOST RECENT Market Data (Last 30 Days)**
-
-CRITICAL: Use the MOST RECENT data available. Check the current date and prioritize 2025 data over 2024 data.
-
-Search Yahoo Finance, Bloomberg, MarketWatch for:
-
-**Balance Sheet Data (LATEST QUARTER AVAILABLE):**
-- Cash and cash equivalents (most recent quarter - Q3 2025 or later if available)
-- Total debt (short-term + long-term, latest quarter)
-- Current ratio (latest)
-- Debt-to-equity ratio (latest)
-
-**Market Data (CURRENT, NOT HISTORICAL):**
-- Current stock price and 52-week range (today's data)
-- Market cap (current)
-- Analyst price targets and ratings (last 30 days)
-- Recent news or catalysts (last 30 days only)
-
-**Use SEC data above for:**
-- Revenue, net income, margins (already extracted)
-- Business description and trends
-
-If SEC data says "See financial sites for balance sheet", search Yahoo Finance for cash/debt figures.
-
-**STEP 2: Calculate Health Score (0-100)**
-
-Scoring rubric (MUST total 0-100 before penalties):
-
-Financial Strength (0-30 points):
-- 25-30: Cash > 2x debt, positive FCF, no burn concerns
-- 15-24: Cash > debt, manageable burn, 2+ year runway
-- 5-14: Cash < debt but serviceable, or high burn with <2yr runway
-- 0-4: Liquidity crisis, going concern risk
-
-Profitability (0-30 points):
-- 25-30: Net margin >10%, strong FCF, consistent EBITDA
-- 15-24: Net margin 3-10%, positive FCF, positive EBITDA
-- 5-14: Breakeven to small losses, negative FCF but improving
-- 0-4: Large losses, severe cash burn, no path to profitability
-
-Growth (0-20 points):
-- 15-20: Revenue growing >15% YoY, accelerating
-- 10-14: Revenue growing 5-15% YoY, stable
-- 5-9: Revenue flat or slightly declining (<5%)
-- 0-4: Revenue declining >10% YoY
-
-Momentum (0-15 points):
-- 12-15: Beat earnings, raised guidance, expanding margins
-- 8-11: Met expectations, maintained guidance, stable margins
-- 4-7: Slight miss, lowered guidance, margins compressing
-- 0-3: Major miss, cut guidance, margins collapsing
-
-Other Factors (0-5 points):
-- Market position, competitive moat, management quality
-
-Penalties (subtract from total):
-- Going concern warning: -10
-- Material weakness in controls: -5
-- Cash burn with <1yr runway: -10
-- Regulatory crisis: -5 to -15
-
-SCORING RULES:
-1. Must show your math: "30 + 18 + 12 + 8 + 3 - 5 = 66"
-2. Be harsh on unprofitable companies (<50)
-3. Be generous with profitable growers (>70)
-4. Never give >90 unless truly exceptional
-
-**STEP 3: Write EXACTLY 5 Bullets**
-
-Each bullet must:
-- Use icon: ✓ (positive), ✗ (negative), or ⚠ (warning)
-- Include REAL NUMBERS from the data
-- Be ONE SENTENCE, punchy and direct
-- No fluff words like "meaningful", "substantial", "amid"
-
-Required bullets (in order):
-1. Balance sheet → "$XXB cash vs $XXB debt, [status/burn info]"
-2. Growth → "Revenue [grew/shrank] XX% YoY to $XXB in [MOST RECENT QUARTER]—[trend]"
-3. Profitability → "Net margin at XX% and [positive/negative] free cash flow—[status]"
-4. Momentum → "[Beat/Missed] [MOST RECENT QUARTER] earnings; guidance [raised/cut/maintained], [margin trend]"
-5. Risk → "[Key risk or opportunity with specific impact]"
-
-CRITICAL: Use the MOST RECENT QUARTER available in your search results. If current date is in 2025, you should be using Q1/Q2/Q3 2025 data, NOT Q4 2024 annual data.
-
-**WRITING STYLE RULES - SOUND HUMAN, NOT AI:**
-
-✓ DO THIS:
-- Lead with numbers: "$14B cash vs $3B debt, but burning $2B/quarter"
-- Use simple verbs: "shrank", "crashed", "burning", "bleeding", "stalled"
-- Show implications: "two quarters of burn would halve liquidity"
-- Be direct: "unprofitable" not "suboptimal profitability dynamics"
-- Active voice: "Revenue fell 15%" not "A decline in revenue was observed"
-
-✗ NEVER DO THIS:
-- Jargon: "amid headwinds", "robust dynamics", "meaningful trajectory"
-- Obscure metrics: "Altman Z-score", "DSO", "working capital efficiency", "ROIC"
-- Hedging: "appears to suggest", "potentially indicates", "may exhibit"
-- Consultant-speak: "optimization", "leverage expansion", "operational dynamics"
-- Percentage jargon: "basis points" (just say "from 5.2% to 7.8%")
-- Empty words: "robust", "significant", "meaningful", "substantial", "considerable"
-- Academic terms: "liquidity dynamics", "margin trajectory", "revenue optimization"
-
-✗ NEVER USE FINANCIAL ACRONYMS - ALWAYS TRANSLATE TO PLAIN LANGUAGE:
-- "ROTCE" → say "return on equity" or "returns to shareholders"
-- "NII" → say "interest income" or "lending profit"
-- "EBITDA" → say "operating profit"
-- "FCF" → spell out "free cash flow" (never use acronym alone)
-- "ARPU" → say "revenue per customer"
-- "CET1" → say "core capital"
-- "NIM" → say "lending margin"
-- "NCO" → say "credit losses"
-- "YTD" → spell out "year-to-date" (never use acronym alone)
-- "LTV/CAC" → say "customer value vs acquisition cost"
-- "RWA" → say "risk-weighted assets"
-
-Exception: Q1/Q2/Q3/Q4 and YoY are acceptable (universally known).
-
-GOOD EXAMPLES:
-✓ "$18B cash vs $7B debt, generating $6B operating cash flow—balance sheet rock solid"
-✓ "Revenue shrank 11% YoY to $22B in Q2—automotive down 15%, growth stalled"
-✓ "Net margin at 5.3% and positive free cash flow—profitable but margins compressed from 8.1% to 5.3%"
-
-BAD EXAMPLES (AI-SOUNDING):
-✗ "The firm exhibits robust liquidity dynamics with an Altman Z-score of 3.2"
-✗ "Operational leverage optimization has driven margin expansion amid headwinds"
-✗ "Revenue trajectory appears to suggest decelerating momentum dynamics"
-
-GOOD EXAMPLES - BANK SPECIFIC:
-✓ "Return on equity 15.4%—generating strong returns for shareholders"
-✓ "Interest income up 6% YoY to $14.2B—core lending business growing steadily"
-✓ "Core capital ratio 12.1% vs regulatory minimum 10.5%—balance sheet rock solid"
-
-BAD EXAMPLES - BANK JARGON (AI-SOUNDING):
-✗ "ROTCE expanded 140 basis points to 15.4% amid NIM compression dynamics"
-✗ "CET1 ratio robust at 12.1% despite RWA optimization headwinds"
-✗ "NII trajectory reflects deposit beta sensitivity to rate normalization"
-
-**STEP 4: FINAL QUALITY REVIEW (Do this BEFORE outputting HTML)**
-
-Before you output the HTML, verify:
-
-DATE CHECK:
-- What is today's date? (You have access to current date)
-- What quarter did I use in my bullets? (Q1/Q2/Q3/Q4 and year)
-- Is this the MOST RECENT quarter available?
-- If today is in 2025 and I used Q4 2024 data, STOP and search for Q1/Q2/Q3 2025 data instead
-
-QUALITY CHECK:
-- Do all 5 bullets use REAL NUMBERS from the data?
-- Are quarters/years consistent across all bullets?
-- Did I avoid acronyms (ROTCE, NII, YTD, FCF without spelling out)?
-- Is each bullet ONE sentence?
-- Did I use plain language, not jargon?
-
-If ANY check fails, FIX IT before outputting HTML.
-
-**STEP 5: Output HTML (Only After Review)**
-
-<div class="health-report">
-<div class="company-header">
-<div class="company-name">{company_name.upper()}</div>
-</div>
-<div class="health-score-display">
-<div class="score-label">FINANCIAL HEALTH SCORE</div>
-<div class="score-value">
-<span class="score-number">XX</span>
-<span class="score-max">/100</span>
-<span class="score-indicator">🟢</span>
-</div>
-<!-- Score calculation: Financial(XX) + Profitability(XX) + Growth(XX) + Momentum(XX) + Other(X) - Penalties(X) = XX -->
-</div>
-<div class="key-points">
-<div class="points-header">5 Key Insights from Latest SEC Filings:</div>
-<div class="point-item positive">
-<span class="point-icon">✓</span>
-<div class="point-text">$XXB cash vs $XXB debt...</div>
-</div>
-<div class="point-item negative">
-<span class="point-icon">✗</span>
-<div class="point-text">Revenue shrank XX% YoY...</div>
-</div>
-<div class="point-item warning">
-<span class="point-icon">⚠</span>
-<div class="point-text">Net margin at XX%...</div>
-</div>
-<div class="point-item positive">
-<span class="point-icon">✓</span>
-<div class="point-text">Beat QX earnings...</div>
-</div>
-<div class="point-item warning">
-<span class="point-icon">⚠</span>
-<div class="point-text">Risk assessment...</div>
-</div>
-</div>
-</div>
-
-Score indicator emojis:
-- 80-100: 🟢 (green)
-- 60-79: 🟡 (yellow)  
-- 40-59: 🟠 (orange)
-- 0-39: 🔴 (red)
-
-Point classes:
-- Use class="positive" for ✓ bullets
-- Use class="negative" for ✗ bullets
-- Use class="warning" for ⚠ bullets
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-🔴 CRITICAL REQUIREMENTS 🔴
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-⚠️ MANDATORY HTML OUTPUT ⚠️
-YOU MUST OUTPUT THE HTML STRUCTURE ABOVE NO MATTER WHAT!
-- NEVER output plain text explanations
-- NEVER say "I cannot complete this" or "Missing critical data"
-- NEVER explain why you can't do something
-- If data is missing, use "N/A" or estimates with "~" prefix
-- If you only have partial data, use what you have and estimate the rest
-
-1. Output ONLY the HTML structure shown above - no extra sections
-2. EXACTLY 5 bullet points - no more, no less
-3. Each bullet = ONE sentence with real numbers (or "~$X" for estimates)
-4. No tables, no additional commentary, no explanatory paragraphs
-5. Pure HTML only (no markdown, no code blocks, no backticks)
-6. Start with <div class="health-report"> and end with </div>
-7. Use NET margin for profitability, NOT gross margin
-8. Be brutally honest - unprofitable burners get low scores (30-50)
-9. EVEN WITH MISSING DATA, OUTPUT THE HTML FORMAT!
-"""
+    comprehensive_prompt = _load_prompt("financial_health_report.txt").format(
+        company_name=company_name,
+        sec_data=sec_data
+    )
 
     try:
         response = perplexity_request_with_retry(
@@ -588,22 +966,26 @@ YOU MUST OUTPUT THE HTML STRUCTURE ABOVE NO MATTER WHAT!
             model="sonar-reasoning-pro",  # Using sonar-reasoning-pro for advanced reasoning and report writing
             messages=[{"role": "user", "content": comprehensive_prompt}],
             web_search_options={"search_context_size": "high"},  # Maximum reasoning for comprehensive analysis
-            max_retries=3
+            max_retries=3,
+            cache_if=_is_renderable_report  # a bad answer is shown once, then asked for again
         )
         
-        html_report = response['choices'][0]['message']['content']
-        call2_sources = response.get('citations', [])
+        html_report, call2_sources = _extract_content_and_citations(response)
         
-        # Strip <think> tags from Call 2 response
-        html_report = re.sub(r'<think>.*?</think>', '', html_report, flags=re.DOTALL).strip()
+        # Strip <think> tags and markdown code blocks from Call 2 response
+        html_report = _clean_report_text(html_report)
         
-        # Strip markdown code blocks if present
-        if html_report.startswith('```'):
-            html_report = re.sub(r'^```\w*\n', '', html_report)
-            html_report = re.sub(r'\n```$', '', html_report).strip()
-        
-        # Sanitize and validate HTML
-        html_report = sanitize_and_validate_html(html_report)
+        # Render the JSON answer. A JSON answer that can't be used is an error
+        # (sanitizing would just show the raw JSON); any other answer - HTML,
+        # markdown or prose - is sanitized and shown as before. Neither is
+        # cached (see _is_renderable_report)
+        rendered = _render_health_report(company_name, html_report)
+        if rendered is not None:
+            html_report = rendered
+        elif html_report.startswith('{'):
+            raise Exception("Call 2 returned JSON that could not be rendered")
+        else:
+            html_report = sanitize_and_validate_html(html_report)
         
         print(f"[OK] Report generated: {len(html_report)} chars, {len(call2_sources)} market sources")
         return html_report, call2_sources
@@ -613,28 +995,26 @@ YOU MUST OUTPUT THE HTML STRUCTURE ABOVE NO MATTER WHAT!
         return f"<div>Error generating report: {str(e)}</div>", []
 
 
-def _env_bool(name: str, default: bool = False) -> bool:
-    v = os.getenv(name)
-    if v is None:
-        return default
-    return v.strip().lower() in ("1", "true", "yes", "y", "on")
+def _dedupe_by_url(*source_lists: List[Dict[str, Any]], count_sec: bool = False):
+    """
+    Merge source lists, dropping duplicate URLs. The lists are walked in
+    order without being concatenated.
 
-def _dedupe_by_url(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    Items must already be normalized (see _normalize_citations), so this is a
+    plain set-membership walk. With count_sec=True returns (deduped, sec_count),
+    counting sec.gov sources (is_sec) in the same pass.
+    """
     seen = set()
     out = []
-    for it in items:
-        # Handle both dict and string sources
-        if isinstance(it, dict):
-            url = (it.get("url") or "").strip()
-        elif isinstance(it, str):
-            url = it.strip()
-            it = {"url": url, "title": "Source"}
-        else:
-            continue
-
-        if url and url not in seen:
+    sec_count = 0
+    for it in itertools.chain.from_iterable(source_lists):
+        url = it["url"]
+        if url not in seen:
             seen.add(url)
             out.append(it)
+            sec_count += it["is_sec"]
+    if count_sec:
+        return out, sec_count
     return out
 
 
@@ -642,121 +1022,228 @@ def _dedupe_by_url(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
 # DATA GATHERING
 # =====================================================================
 
-def gather_perplexity_data(company_name: str, api_key: str, progress_callback=None) -> Dict[str, Any]:
-    """
-    Gather SEC data from Perplexity for financial research.
+# On-disk memo of Call 1 results, so re-opening a ticker the same day skips the
+# multi-second (paid) Perplexity round-trip. Bump the version when the stored
+# shape changes.
+_PERPLEXITY_CACHE_DIR = Path.home() / ".cache" / "finapp" / "perplexity"
+_PERPLEXITY_CACHE_VERSION = 3  # 2: all_sources holds normalized dicts, 3: with is_sec
+
+# Entries are zstd-compressed when zstandard is installed (SEC text shrinks
+# several-fold). Compressor objects aren't safe for concurrent use, so calls
+# are serialized - each takes well under a millisecond.
+try:
+    import zstandard
+    _ZSTD_COMPRESSOR = zstandard.ZstdCompressor(level=3)
+    _ZSTD_DECOMPRESSOR = zstandard.ZstdDecompressor()
+    _ZSTD_LOCK = threading.Lock()
+    _CACHE_SUFFIX = ".json.zst"
+except ImportError:
+    zstandard = None
+    _CACHE_SUFFIX = ".json"
+
+
+def _read_cache_entry(path: Path) -> Optional[Dict[str, Any]]:
+    try:
+        data = path.read_bytes()
+        if zstandard is not None:
+            with _ZSTD_LOCK:
+                data = _ZSTD_DECOMPRESSOR.decompress(data)
+        return _json_loads(data)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"[WARNING] Ignoring unreadable cache entry {path.name}: {e}")
+        return None
 
-    Returns:
-    - sec_data: Financial and context data from SEC
-    - sector/industry: For business model detection
-    - all_sources: Combined citations
+
+def _write_cache_entry(path: Path, entry: Dict[str, Any]):
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        data = _json_dumps(entry)
+        if zstandard is not None:
+            with _ZSTD_LOCK:
+                data = _ZSTD_COMPRESSOR.compress(data)
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)  # atomic - readers never see a partial file
+    except Exception as e:
+        print(f"[WARNING] Could not write cache entry {path.name}: {e}")
+
+
+# Exception types a cached failure is re-raised as (anything else: Exception)
+_CACHED_ERROR_TYPES = {cls.__name__: cls for cls in (CircuitOpenError, PermanentAPIError)}
+
+
+def _disk_cache(
+    ttl_hours: float = 6,
+    error_ttl_seconds: float = 30,
+    decode: Optional[Callable[[Any], Any]] = None,
+    cache_if: Optional[Callable[[Any], bool]] = None
+):
     """
+    Memoize a company-keyed fetch on disk, keyed by (company name, today's date).
+    
+    Results are reused for ttl_hours. Failures are remembered for
+    error_ttl_seconds in a separate file and re-raised with their original
+    type (for CircuitOpenError/PermanentAPIError), so an outage isn't hammered
+    by reruns; a failed refresh never clobbers a good cached value.
+    Pass force_refresh=True to the wrapped function to bypass the cache.
+    decode, if given, restores what the JSON round-trip loses (e.g. tuples)
+    on values read back from disk. cache_if, if given, decides whether a
+    result is worth storing; rejected results are returned but not written.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(company_name: str, *args, force_refresh: bool = False, **kwargs):
+            key = f"v{_PERPLEXITY_CACHE_VERSION}|{company_name.strip().lower()}|{datetime.now().date().isoformat()}"
+            digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+            path = _PERPLEXITY_CACHE_DIR / f"{digest}{_CACHE_SUFFIX}"
+            error_path = _PERPLEXITY_CACHE_DIR / f"{digest}.error{_CACHE_SUFFIX}"
+            
+            if not force_refresh:
+                entry = _read_cache_entry(path)
+                if entry is not None:
+                    age = time.time() - entry.get("stored_at", 0)
+                    if age < ttl_hours * 3600:
+                        print(f"[CACHE] Using cached data for {company_name} ({age / 60:.0f} min old)")
+                        return decode(entry["value"]) if decode else entry["value"]
+                
+                entry = _read_cache_entry(error_path)
+                if entry is not None:
+                    age = time.time() - entry.get("stored_at", 0)
+                    if age < error_ttl_seconds:
+                        error_type = _CACHED_ERROR_TYPES.get(entry.get("error_type"), Exception)
+                        raise error_type(f"{entry['error']} (cached failure, retry in {error_ttl_seconds - age:.0f}s)")
+            
+            try:
+                value = fn(company_name, *args, **kwargs)
+            except Exception as e:
+                _write_cache_entry(error_path, {"stored_at": time.time(), "error": str(e), "error_type": type(e).__name__})
+                raise
+            if cache_if is None or cache_if(value):
+                _write_cache_entry(path, {"stored_at": time.time(), "value": value})
+            error_path.unlink(missing_ok=True)
+            return value
+        return wrapper
+    return decorator
+
+
+# Sector keywords in priority order - the first group with any hit wins
+_SECTOR_KEYWORDS = (
+    (("software", "saas", "cloud"), ("Technology", "Software")),
+    (("retail", "consumer"), ("Consumer", "Retail")),
+    (("manufacturing", "industrial"), ("Industrials", "Manufacturing")),
+    (("bank", "financial services"), ("Financial", "Banking")),
+    (("oil", "energy", "mining", "petroleum", "gas"), ("Energy", "Oil & Gas")),
+    (("healthcare", "pharmaceutical", "biotech", "medical"), ("Healthcare", "Healthcare")),
+    (("telecom", "communication"), ("Communication", "Telecommunications")),
+)
+# Lookahead so overlapping keywords are all seen, like plain substring checks
+_SECTOR_RE = re.compile(
+    "(?=(" + "|".join(re.escape(kw) for keywords, _ in _SECTOR_KEYWORDS for kw in keywords) + "))",
+    re.IGNORECASE
+)
 
-    # CALL 1: Comprehensive SEC Data
-    if progress_callback:
-        progress_callback(1, "Gathering SEC filing data...")
-    print(f"[Call 1/2] Comprehensive SEC data for {company_name}...")
 
-    sec_comprehensive_query = f"""Find {company_name}'s OWN recent SEC filing where {company_name} is the FILER (not third-party mentions).
+def _detect_sector(text: str):
+    """(sector, industry) from keyword mentions in one regex pass, ("", "") if none"""
+    found = {m.group(1).lower() for m in _SECTOR_RE.finditer(text)}
+    for keywords, sector_industry in _SECTOR_KEYWORDS:
+        if found.intersection(keywords):
+            return sector_industry
+    return "", ""
 
-For US companies: Search for 10-Q (quarterly) or 10-K (annual) filings.
-For foreign companies (ADRs): Search for 20-F (annual) or 6-K (current report) filings.
 
-Search for SEC filings filed BY {company_name}, not filings that just mention {company_name}.
+# Appended to the Call 1 query when the first answer comes back too thin
+_SEC_RETRY_ADDENDUM = (
+    "\n\nIMPORTANT: Search more broadly. Try variations of the company name. "
+    "Look for ANY recent financial data about this company from SEC filings, earnings reports, "
+    "or financial statements. Include investor presentations if needed."
+)
 
-**FROM THE FILING TEXT, FIND AND REPORT:**
 
-**1. REVENUE (Income Statement - REQUIRED):**
-- Total revenue for most recent quarter: $X.XB
-- Total revenue for year-ago quarter: $X.XB
-- Calculate YoY growth: X.X%
-- Format: "Revenue Q[X] 20XX: $X.XB vs Q[X] 20XX: $X.XB (+/-X.X% YoY)"
+def _decode_perplexity_data(value: Dict[str, Any]) -> Dict[str, Any]:
+    # JSON has no tuples - give cached results the same all_sources type as fresh ones
+    return {**value, "all_sources": tuple(value["all_sources"])}
 
-**2. PROFITABILITY (Income Statement - REQUIRED):**
-- Net income for most recent quarter: $X.XB
-- Operating income: $X.XB (if mentioned)
-- Calculate net margin: (Net income / Revenue) × 100
-- Format: "Net income Q[X] 20XX: $X.XB (X.X% margin)"
 
-**3. CASH FLOW (if mentioned in filing summary):**
-- Operating cash flow: $X.XB
-- Free cash flow: $X.XB (if stated)
-- Capital expenditures: $X.XB (if stated)
+def _worth_caching(value: Dict[str, Any]) -> bool:
+    # Thin SEC data isn't stored, so the next run asks Perplexity again
+    return not _sec_data_is_thin(value["sec_data"])
 
-**4. BUSINESS CONTEXT:**
-- What does the company do? (1 sentence)
-- Industry sector
-- Key trends: Is revenue accelerating or decelerating quarter-over-quarter?
-- Are margins expanding or contracting?
-- Major risks mentioned in Risk Factors section (top 2-3)
-- Recent guidance changes: raised, lowered, or maintained?
 
-**5. EARNINGS PERFORMANCE:**
-- Did they beat or miss analyst expectations? (if mentioned)
-- Any going concern warnings or liquidity issues flagged?
+@_disk_cache(ttl_hours=6, decode=_decode_perplexity_data, cache_if=_worth_caching)
+def gather_perplexity_data(company_name: str, api_key: str, progress_callback=None) -> Dict[str, Any]:
+    """
+    Gather SEC data from Perplexity for financial research.
 
-**6. BALANCE SHEET NOTE:**
-If cash/debt figures aren't clearly visible in the search results, write:
-"Balance sheet: Not extracted from SEC search - see Call 2 for cash/debt data"
+    Results are cached on disk per company and day (see _disk_cache);
+    pass force_refresh=True to skip the cache.
 
-**CRITICAL REQUIREMENTS:**
-1. Revenue and net income are MANDATORY - extract from income statement
-2. Calculate YoY percentages accurately: ((Current - Prior) / Prior) × 100
-3. Use actual dollar amounts from filing, not estimates
-4. If a metric truly isn't findable, say "Not mentioned in filing"
+    Returns:
+    - sec_data: Financial and context data from SEC
+    - sector/industry: For business model detection
+    - all_sources: Combined citations (a tuple - callers merge, never mutate)
+    """
 
-**FORMAT EXAMPLE:**
-Revenue Q2 2025: $22.5B vs Q2 2024: $25.5B (-11.8% YoY)
-Net income Q2 2025: $1.2B (5.3% margin)
-Operating cash flow: $4.7B
-Balance sheet: Not extracted - see Call 2
+    # CALL 1: Comprehensive SEC Data
+    if progress_callback:
+        progress_callback(1, "Gathering SEC filing data...")
+    print(f"[Call 1/2] Comprehensive SEC data for {company_name}...")
 
-**SOURCES USED:**
-- List all SEC filing URLs referenced"""
+    sec_comprehensive_query = _load_prompt("sec_data_query.txt").format(company_name=company_name)
 
-    sec_response = perplexity_request_with_retry(
+    sec_request = dict(
         api_key=api_key,
         model="sonar-reasoning-pro",  # Using sonar-reasoning-pro for SEC data extraction with reasoning
         messages=[{"role": "user", "content": sec_comprehensive_query}],
         web_search_options={"search_context_size": "high"},  # High context for comprehensive SEC data extraction
         max_retries=5
     )
+    if progress_callback:
+        # Stream so the progress line can show the (long) reasoning call arriving.
+        # This skips the in-memory result cache (the disk cache above still
+        # applies); identical in-flight calls are still coalesced
+        sec_response = perplexity_request_streaming(
+            **sec_request,
+            on_progress=lambda chars: progress_callback(1, f"Gathering SEC filing data... ({chars:,} chars received)")
+        )
+    else:
+        sec_response = perplexity_request_with_retry(**sec_request, cache_if=_has_sec_data)
 
-    sec_data = sec_response['choices'][0]['message']['content']
+    sec_data, sec_sources = _extract_content_and_citations(sec_response)
     
     # Strip <think> tags if present (sonar-reasoning-pro sometimes exposes internal reasoning)
-    import re
-    sec_data = re.sub(r'<think>.*?</think>', '', sec_data, flags=re.DOTALL).strip()
+    sec_data = _THINK_RE.sub('', sec_data).strip()
     
     # Check if Call 1 returned insufficient data
-    if len(sec_data) < 500 or "cannot" in sec_data.lower() or "not available" in sec_data.lower() or "missing critical data" in sec_data.lower():
+    if _sec_data_is_thin(sec_data):
         print(f"[WARNING] Call 1 may have insufficient data (only {len(sec_data)} chars). Response preview: {sec_data[:200]}...")
         # Retry once with a more specific prompt for companies with limited data
         if "cannot" in sec_data.lower() or len(sec_data) < 300:
             print("[RETRY] Attempting Call 1 again with broader search...")
-            sec_comprehensive_query_retry = sec_comprehensive_query + "\n\nIMPORTANT: Search more broadly. Try variations of the company name. Look for ANY recent financial data about this company from SEC filings, earnings reports, or financial statements. Include investor presentations if needed."
+            sec_comprehensive_query_retry = sec_comprehensive_query + _SEC_RETRY_ADDENDUM
             sec_response_retry = perplexity_request_with_retry(
                 api_key=api_key,
                 model="sonar-reasoning-pro",
                 messages=[{"role": "user", "content": sec_comprehensive_query_retry}],
                 web_search_options={"search_context_size": "high"},
-                max_retries=2
+                max_retries=2,
+                cache_if=_has_sec_data
             )
             if sec_response_retry and 'choices' in sec_response_retry:
-                sec_data_retry = sec_response_retry['choices'][0]['message']['content']
-                sec_data_retry = re.sub(r'<think>.*?</think>', '', sec_data_retry, flags=re.DOTALL).strip()
+                sec_data_retry, sec_sources_retry = _extract_content_and_citations(sec_response_retry)
+                sec_data_retry = _THINK_RE.sub('', sec_data_retry).strip()
                 if len(sec_data_retry) > len(sec_data):
                     print(f"[OK] Retry successful: {len(sec_data_retry)} chars")
                     sec_data = sec_data_retry
-                    sec_response = sec_response_retry
-
-    # Extract citations from API metadata or parse from response text
-    sec_sources = sec_response.get('citations', [])
+                    sec_sources = sec_sources_retry
 
+    # Citations come from API metadata; if missing, parse them from the response text
     if len(sec_sources) == 0:
         # API didn't return citations - parse URLs from response text
-        urls = re.findall(r'https://www\.sec\.gov/[^\s\)\]]+', sec_data)
-        sec_sources = [{'url': url, 'title': 'SEC Filing'} for url in urls]
+        urls = _SEC_URL_RE.findall(sec_data)
+        sec_sources = [{'url': url, 'title': 'SEC Filing', 'is_sec': True} for url in dict.fromkeys(urls)]
         print(f"[OK] Extracted {len(sec_sources)} SEC citations from response text")
     else:
         print(f"[OK] Got {len(sec_sources)} citations from API metadata")
@@ -764,31 +1251,7 @@ Balance sheet: Not extracted - see Call 2
     print(f"[OK] SEC data: {len(sec_data)} chars from {len(sec_sources)} filings")
 
     # Extract sector/industry from SEC data (for informational purposes)
-    sec_lower = sec_data.lower()
-    sector_match = ""
-    industry_match = ""
-
-    if "software" in sec_lower or "saas" in sec_lower or "cloud" in sec_lower:
-        sector_match = "Technology"
-        industry_match = "Software"
-    elif "retail" in sec_lower or "consumer" in sec_lower:
-        sector_match = "Consumer"
-        industry_match = "Retail"
-    elif "manufacturing" in sec_lower or "industrial" in sec_lower:
-        sector_match = "Industrials"
-        industry_match = "Manufacturing"
-    elif "bank" in sec_lower or "financial services" in sec_lower:
-        sector_match = "Financial"
-        industry_match = "Banking"
-    elif "oil" in sec_lower or "energy" in sec_lower or "mining" in sec_lower or "petroleum" in sec_lower or "gas" in sec_lower:
-        sector_match = "Energy"
-        industry_match = "Oil & Gas"
-    elif "healthcare" in sec_lower or "pharmaceutical" in sec_lower or "biotech" in sec_lower or "medical" in sec_lower:
-        sector_match = "Healthcare"
-        industry_match = "Healthcare"
-    elif "telecom" in sec_lower or "communication" in sec_lower:
-        sector_match = "Communication"
-        industry_match = "Telecommunications"
+    sector_match, industry_match = _detect_sector(sec_data)
 
     return {
         "sec_data": sec_data,
@@ -796,16 +1259,43 @@ Balance sheet: Not extracted - see Call 2
         "earnings_quotes": None,
         "sector": sector_match,
         "industry": industry_match,
-        "all_sources": sec_sources
+        "all_sources": tuple(sec_sources)
     }
 
 
+async def gather_perplexity_data_async(
+    company_names: List[str],
+    api_key: str,
+    max_concurrency: int = 5
+) -> List[Any]:
+    """
+    Run Call 1 for several companies concurrently.
+    
+    Each company goes through gather_perplexity_data in a worker thread, so the
+    disk cache, retry session, circuit breaker and single-flight all still
+    apply. At most max_concurrency calls are in flight at once. Results are in
+    input order; a company that fails yields its exception instead of a dict.
+    """
+    sem = asyncio.Semaphore(max_concurrency)
+    
+    async def one(company_name: str):
+        async with sem:
+            return await asyncio.to_thread(gather_perplexity_data, company_name, api_key)
+    
+    return await asyncio.gather(*(one(name) for name in company_names), return_exceptions=True)
+
+
+def gather_perplexity_data_batch(company_names: List[str], api_key: str, max_concurrency: int = 5) -> List[Any]:
+    """Synchronous wrapper around gather_perplexity_data_async"""
+    return _run_sync(gather_perplexity_data_async(company_names, api_key, max_concurrency))
+
+
 # =====================================================================
 # REPORT GENERATION
 # =====================================================================
 
 
-def generate_financial_report_with_perplexity(company_name: str, progress_callback=None) -> Dict[str, Any]:
+def generate_financial_report_with_perplexity(company_name: str, progress_callback=None, force_refresh: bool = False) -> Dict[str, Any]:
     """
     Generate equity research report using PURE Perplexity (no OpenAI).
 
@@ -818,6 +1308,9 @@ def generate_financial_report_with_perplexity(company_name: str, progress_callba
     - Faster (fewer API calls)
     - Simpler (single provider)
     - Consistent reasoning model across both calls
+
+    force_refresh=True skips both the disk cache and the in-memory API
+    response cache, for when a cached report looks wrong.
     """
     
     # STEP 1: Validate API key
@@ -845,22 +1338,24 @@ def generate_financial_report_with_perplexity(company_name: str, progress_callba
     
     try:
         # STEP 2: Gather data from Perplexity (4 searches)
-        start_time = time.time()
-        
-        perplexity_data = gather_perplexity_data(company_name, perplexity_api_key, progress_callback)
+        # Timings are only taken when debugging - they feed print statements only
+        if _DEBUG:
+            start_ns = time.perf_counter_ns()
         
-        # Record successful searches
-        _perplexity_circuit_breaker.record_success()
+        if force_refresh:
+            _pplx_call_cached.clear()
+        perplexity_data = gather_perplexity_data(
+            company_name, perplexity_api_key, progress_callback, force_refresh=force_refresh
+        )
         
-        search_time = time.time() - start_time
-        print(f"[OK] Data gathering complete: {search_time:.1f}s")
+        if _DEBUG:
+            report_start_ns = time.perf_counter_ns()
+            print(f"[OK] Data gathering complete: {(report_start_ns - start_ns) / 1e9:.1f}s")
         
         # STEP 3: Generate HTML report using Perplexity
         if progress_callback:
             progress_callback(2, "Analyzing and generating report...")
         
-        report_start = time.time()
-        
         report_html, call2_sources = generate_report_with_perplexity(
             company_name=company_name,
             sec_data=perplexity_data['sec_data'],
@@ -869,20 +1364,15 @@ def generate_financial_report_with_perplexity(company_name: str, progress_callba
             api_key=perplexity_api_key
         )
         
-        report_time = time.time() - report_start
-        total_time = time.time() - start_time
-        
-        print(f"[OK] Report generated: {report_time:.1f}s")
-        print(f"[OK] Total time: {total_time:.1f}s")
+        if _DEBUG:
+            end_ns = time.perf_counter_ns()
+            print(f"[OK] Report generated: {(end_ns - report_start_ns) / 1e9:.1f}s")
+            print(f"[OK] Total time: {(end_ns - start_ns) / 1e9:.1f}s")
         
-        # Combine sources from both calls
-        sources = perplexity_data['all_sources']  # Call 1 SEC sources
-        sources.extend(call2_sources)  # Add Call 2 market sources
+        # Merge Call 1 SEC sources with Call 2 market sources, deduplicating
+        # and counting SEC filings in one pass
+        sources, num_sec = _dedupe_by_url(perplexity_data['all_sources'], call2_sources, count_sec=True)
         
-        # Deduplicate sources
-        sources = _dedupe_by_url(sources)
-        
-        num_sec = sum(1 for s in sources if isinstance(s, dict) and 'sec.gov' in s.get('url', ''))
         print(f"[OK] Sources: {len(sources)} total ({num_sec} from SEC)")
         
         return {
@@ -896,10 +1386,9 @@ def generate_financial_report_with_perplexity(company_name: str, progress_callba
         
     except Exception as e:
         print(f"[ERROR] Report generation failed: {e}")
-        _perplexity_circuit_breaker.record_failure()
-        
-        import traceback
-        print(traceback.format_exc())
+        # Full stack traces only when asked for - the one-line error above is enough otherwise
+        if _env_bool("DEBUG_TRACEBACKS"):
+            print(traceback.format_exc())
         
         return {
             "report": f"Report generation error: {str(e)}",
@@ -909,6 +1398,19 @@ def generate_financial_report_with_perplexity(company_name: str, progress_callba
         }
 
 
+
+def generate_reports_bulk(company_names: List[str], max_workers: int = 8) -> List[Dict[str, Any]]:
+    """
+    Generate reports for several companies in parallel threads.
+    
+    The work is network-bound, so threads overlap the Perplexity round-trips
+    while all sharing the pooled keep-alive session. Results come back in
+    input order with the same shape as generate_financial_report_with_perplexity
+    (failures are reported via success=False, not raised).
+    """
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="report") as executor:
+        return list(executor.map(generate_financial_report_with_perplexity, company_names))
+
 # ============================================================================
 # TRADINGVIEW WIDGETS
 # ============================================================================
@@ -919,15 +1421,40 @@ from tradingview_widgets import (
     generate_stock_chart_widget
 )
 
+# Widget HTML is a pure function of the symbol, so it is cached across reruns;
+# only components.html() has to run every time.
+
+@st.cache_data(ttl=86400, max_entries=512, show_spinner=False)
+def _technical_analysis_html(symbol: str) -> str:
+    return generate_technical_analysis_widget(
+        symbol=symbol,
+        display_mode="single",
+        width="100%",
+        height=400,
+        is_transparent=True
+    )
+
+@st.cache_data(ttl=86400, max_entries=512, show_spinner=False)
+def _financials_html(symbol: str) -> str:
+    return generate_stock_financials_widget(
+        symbol=symbol,
+        display_mode="regular",
+        width="100%",
+        height=400
+    )
+
+@st.cache_data(ttl=86400, max_entries=512, show_spinner=False)
+def _stock_chart_html(symbol: str) -> str:
+    return generate_stock_chart_widget(
+        symbol=symbol,
+        height=500,
+        hide_side_toolbar=True,
+        hide_top_toolbar=False
+    )
+
 def render_technical_analysis_widget(symbol: str) -> bool:
     try:
-        widget_html = generate_technical_analysis_widget(
-            symbol=symbol,
-            display_mode="single",
-            width="100%",
-            height=400,
-            is_transparent=True
-        )
+        widget_html = _technical_analysis_html(symbol)
         components.html(widget_html, height=450)
         return True
     except Exception as e:
@@ -936,12 +1463,7 @@ def render_technical_analysis_widget(symbol: str) -> bool:
 
 def render_financials_widget(symbol: str) -> bool:
     try:
-        widget_html = generate_stock_financials_widget(
-            symbol=symbol,
-            display_mode="regular",
-            width="100%",
-            height=400
-        )
+        widget_html = _financials_html(symbol)
         components.html(widget_html, height=450)
         return True
     except Exception as e:
@@ -950,12 +1472,7 @@ def render_financials_widget(symbol: str) -> bool:
 
 def render_stock_chart_widget(symbol: str) -> bool:
     try:
-        widget_html = generate_stock_chart_widget(
-            symbol=symbol,
-            height=500,
-            hide_side_toolbar=True,
-            hide_top_toolbar=False
-        )
+        widget_html = _stock_chart_html(symbol)
         components.html(widget_html, height=550)
         return True
     except Exception as e: